@@ -0,0 +1,85 @@
+"""
+Cache de la racine du dépôt Git, partagé entre les scripts du projet.
+
+Quand les scripts sont enchaînés (update_version → github_backup, en CI par
+exemple), la racine du dépôt n'est recalculée par git rev-parse qu'une fois
+toutes les CACHE_TTL secondes pour un même répertoire de travail.
+
+Le cache est un petit fichier JSON {"cwd": ..., "root": ..., "ts": ...} placé
+dans le dossier de cache de l'utilisateur ($XDG_CACHE_HOME, ou ~/.cache à défaut).
+Les scripts exécutent du code et des commandes git dans la racine lue: le fichier
+n'est donc accepté que s'il appartient à l'utilisateur courant et n'est modifiable
+que par lui, et la racine doit toujours contenir cwd et un .git.
+"""
+
+import os
+import json
+import time
+import stat
+
+# Durée de validité du cache en secondes
+CACHE_TTL = 300
+
+CACHE_DIR = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+CACHE_PATH = os.path.join(CACHE_DIR, "kite_git_cache.json")
+
+def _is_trusted(file_stat):
+    """Vérifie que le fichier de cache appartient à l'utilisateur courant et à lui seul"""
+    if not stat.S_ISREG(file_stat.st_mode):
+        return False
+    # Pas de notion de propriétaire POSIX sous Windows: le dossier de profil est déjà privé
+    if not hasattr(os, "getuid"):
+        return True
+    return file_stat.st_uid == os.getuid() and not file_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+def _is_valid_root(cwd, root):
+    """Vérifie que root est toujours un dépôt Git qui contient cwd"""
+    if not os.path.isabs(root) or not os.path.exists(os.path.join(root, ".git")):
+        return False
+    try:
+        return os.path.commonpath([cwd, root]) == os.path.normpath(root)
+    except ValueError:
+        # Chemins sur des lecteurs différents (Windows)
+        return False
+
+def load(cwd):
+    """Retourne la racine du dépôt en cache pour cwd, ou None si absente ou expirée"""
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            if not _is_trusted(os.fstat(f.fileno())):
+                return None
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(data, dict) or data.get("cwd") != cwd:
+        return None
+    # Horodatage absent, invalide ou dans le futur: traité comme une entrée expirée
+    ts = data.get("ts")
+    if isinstance(ts, bool) or not isinstance(ts, (int, float)):
+        return None
+    if not 0 <= time.time() - ts <= CACHE_TTL:
+        return None
+
+    root = data.get("root")
+    if not isinstance(root, str) or not _is_valid_root(cwd, root):
+        return None
+    return root
+
+def save(cwd, root):
+    """Enregistre la racine du dépôt pour cwd (un échec d'écriture est ignoré)"""
+    data = {"cwd": cwd, "root": root, "ts": time.time()}
+    tmp_path = f"{CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        # Fichier lisible et modifiable par l'utilisateur seul, quel que soit son umask
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        # Remplacement atomique: un script concurrent ne lit jamais un fichier partiel
+        os.replace(tmp_path, CACHE_PATH)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
@@ -1,26 +1,34 @@
 import os
 import subprocess
 
+PROJECT_DIR = "/workspaces/Kite_Pilote_Public"
+
 def build_firmware():
     """Compile le firmware principal."""
     print("Compilation du firmware...")
-    result = subprocess.run(["pio", "run"], cwd="/workspaces/Kite_Pilote_Public")
+    result = subprocess.run(["pio", "run"], cwd=PROJECT_DIR)
     if result.returncode == 0:
         print("Compilation réussie.")
-    else:
-        print("Erreur lors de la compilation du firmware.")
-        exit(1)
+        return True
+    print("Erreur lors de la compilation du firmware.")
+    return False
 
 def build_filesystem():
     """Génère l'image LittleFS."""
     print("Génération de l'image LittleFS...")
-    result = subprocess.run(["pio", "run", "--target", "buildfs"], cwd="/workspaces/Kite_Pilote_Public")
+    result = subprocess.run(["pio", "run", "--target", "buildfs"], cwd=PROJECT_DIR)
     if result.returncode == 0:
         print("Image LittleFS générée avec succès.")
-    else:
-        print("Erreur lors de la génération de l'image LittleFS.")
-        exit(1)
+        return True
+    print("Erreur lors de la génération de l'image LittleFS.")
+    return False
 
 if __name__ == "__main__":
-    build_filesystem()
-    build_firmware()
\ No newline at end of file
+    # Les deux cibles partagent .pio/build/esp32dev (base de signatures SCons,
+    # project.checksum) et .pio/libdeps, sans verrou côté PlatformIO: elles sont donc
+    # lancées l'une après l'autre. Le firmware passe en premier pour installer les
+    # dépendances et initialiser le dossier de build; buildfs le réutilise ensuite.
+    firmware_ok = build_firmware()
+    filesystem_ok = firmware_ok and build_filesystem()
+    if not (firmware_ok and filesystem_ok):
+        exit(1)
@@ -1,8 +1,68 @@
 #!/usr/bin/env python3
 
 import os
+import re
 import sys
 import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Section [wokwi.littlefs] ou [wokwi.spiffs] de wokwi.toml: l'en-tête et toutes les lignes
+# qui suivent jusqu'au prochain en-tête de section
+FS_SECTION_PATTERN = re.compile(
+    r'^[ \t]*\[wokwi\.(?:littlefs|spiffs)\][^\n]*(?:\n|\Z)'
+    r'(?:(?![ \t]*\[)[^\n]*(?:\n|\Z))*',
+    re.MULTILINE
+)
+
+def walk_files(directory):
+    """Parcourt récursivement un dossier et renvoie le chemin de chaque fichier"""
+    # DirEntry réutilise le type renvoyé par readdir: pas de stat() supplémentaire par fichier
+    # (seuls les liens symboliques vers des fichiers sont résolus, comme avec os.path.isfile)
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path)
+            elif entry.is_file():
+                yield entry.path
+
+def list_files(directory):
+    """Liste les fichiers d'un dossier, chaque sous-dossier de premier niveau étant parcouru en parallèle"""
+    files = []
+    subdirs = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file():
+                files.append(entry.path)
+    
+    if not subdirs:
+        return files
+    
+    # Les lectures de dossiers libèrent le GIL: des threads suffisent à masquer leur latence.
+    # map() conserve l'ordre des sous-dossiers, le résultat reste déterministe.
+    max_workers = min(16, (os.cpu_count() or 1) * 4, len(subdirs))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for subdir_files in executor.map(lambda path: list(walk_files(path)), subdirs):
+            files.extend(subdir_files)
+    return files
+
+def data_signature(files):
+    """Empreinte des fichiers de data/, calculée à partir de leurs métadonnées (sans lire leur contenu)"""
+    digest = hashlib.blake2b()
+    for file_info in sorted(files, key=lambda file_info: file_info["path"]):
+        stat = os.stat(file_info["path"])
+        digest.update(f'{file_info["name"]}:{file_info["path"]}:{stat.st_mtime_ns}:{stat.st_size}\n'.encode())
+    return digest
+
+def config_signature(digest, wokwi_toml):
+    """Complète l'empreinte de data/ avec l'état de wokwi.toml (détecte une modification manuelle)"""
+    digest = digest.copy()
+    if os.path.exists(wokwi_toml):
+        stat = os.stat(wokwi_toml)
+        digest.update(f'{wokwi_toml}:{stat.st_mtime_ns}:{stat.st_size}\n'.encode())
+    return digest.hexdigest()
 
 def create_littlefs_image():
     # Chemin du dossier data contenant les fichiers à inclure dans LittleFS
@@ -15,14 +75,11 @@ def create_littlefs_image():
         
     # Récupérer la liste des fichiers dans le dossier data
     files = []
-    for root, _, filenames in os.walk(data_dir):
-        for filename in filenames:
-            file_path = os.path.join(root, filename)
-            if os.path.isfile(file_path):
-                files.append({
-                    "path": file_path,
-                    "name": file_path[len(data_dir):] if file_path.startswith(data_dir) else file_path
-                })
+    for file_path in list_files(data_dir):
+        files.append({
+            "path": file_path,
+            "name": file_path[len(data_dir):] if file_path.startswith(data_dir) else file_path
+        })
     
     if not files:
         print(f"Erreur: Aucun fichier trouvé dans le dossier '{data_dir}'.")
@@ -30,61 +87,48 @@ def create_littlefs_image():
     
     # Créer ou mettre à jour le fichier wokwi.toml
     wokwi_toml = "wokwi.toml"
+    signature_path = wokwi_toml + ".sig"
     fs_config = ""
     
+    # Si ni data/ ni wokwi.toml n'ont changé depuis la dernière exécution, ne rien réécrire:
+    # cela évite de déclencher inutilement les outils qui surveillent wokwi.toml
+    files_digest = data_signature(files)
+    if os.path.exists(signature_path):
+        with open(signature_path, "r") as f:
+            if f.read().strip() == config_signature(files_digest, wokwi_toml):
+                print(f"Configuration LittleFS déjà à jour ({len(files)} fichiers).")
+                return True
+    
     if os.path.exists(wokwi_toml):
         with open(wokwi_toml, "r") as f:
             fs_config = f.read()
         
-        # Vérifier si une section LittleFS existe déjà
-        if "[wokwi.littlefs]" in fs_config:
-            lines = fs_config.split("\n")
-            new_lines = []
-            skip = False
-            for line in lines:
-                if line.strip() == "[wokwi.littlefs]":
-                    skip = True
-                    new_lines.append(line)
-                elif skip and line.startswith("["):
-                    skip = False
-                    new_lines.append(line)
-                elif not skip:
-                    new_lines.append(line)
-            fs_config = "\n".join(new_lines)
-            
-        # Supprimer l'ancienne section SPIFFS si elle existe
-        if "[wokwi.spiffs]" in fs_config:
-            lines = fs_config.split("\n")
-            new_lines = []
-            skip = False
-            for line in lines:
-                if line.strip() == "[wokwi.spiffs]":
-                    skip = True
-                elif skip and line.startswith("["):
-                    skip = False
-                    new_lines.append(line)
-                elif not skip:
-                    new_lines.append(line)
-            fs_config = "\n".join(new_lines)
+        # Supprimer en une seule passe les anciennes sections LittleFS et SPIFFS,
+        # la section LittleFS étant reconstruite entièrement ci-dessous
+        fs_config = FS_SECTION_PATTERN.sub("", fs_config)
     
-    # Ajouter la configuration LittleFS
-    if "[wokwi.littlefs]" not in fs_config:
-        if fs_config and not fs_config.endswith("\n"):
-            fs_config += "\n"
-        fs_config += "\n[wokwi.littlefs]\n"
-        
-    # Ajouter les entrées pour chaque fichier
-    for file_info in files:
-        file_path = file_info["path"]
-        file_name = file_info["name"]
-        if file_name.startswith("/"):
-            file_name = file_name[1:]
-        fs_config += f'"{file_name}" = "{file_path}"\n'
+    # Ajouter la configuration LittleFS en fin de fichier, séparée par une ligne vide.
+    # Les lignes sont accumulées dans une liste et assemblées en une seule fois.
+    lines = []
+    fs_config = fs_config.rstrip("\n")
+    if fs_config:
+        lines.extend([fs_config, ""])
+    lines.append("[wokwi.littlefs]")
+    
+    # Entrées LittleFS: nom dans le système de fichiers -> chemin local
+    entries = {file_info["name"].lstrip("/"): file_info["path"] for file_info in files}
+    for file_name, file_path in entries.items():
+        lines.append(f'"{file_name}" = "{file_path}"')
+    fs_config = "\n".join(lines) + "\n"
     
     # Écrire la configuration mise à jour dans wokwi.toml
     with open(wokwi_toml, "w") as f:
         f.write(fs_config)
     
+    # Mémoriser l'empreinte pour la prochaine exécution
+    with open(signature_path, "w") as f:
+        f.write(config_signature(files_digest, wokwi_toml) + "\n")
+    
     print(f"Configuration LittleFS mise à jour avec {len(files)} fichiers.")
     return True
 
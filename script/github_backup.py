@@ -9,6 +9,10 @@ Ce script:
 4. Crée un commit avec un message descriptif incluant les modifications
 5. Pousse les changements vers GitHub
 
+Si pygit2 est installé, la détection du dépôt et la lecture du statut passent
+par libgit2 au lieu de lancer git. L'ajout, le commit et le push restent
+confiés à git (hooks et gestionnaires d'identifiants).
+
 Usage:
     python3 script/github_backup.py [--remote NOM_REMOTE] [--branch NOM_BRANCHE]
 """
@@ -17,36 +21,120 @@ import os
 import sys
 import subprocess
 import re
+import shlex
+import shutil
 import argparse
+import asyncio
+import locale
 from datetime import datetime
 
+import _gitcache
+
+# pygit2 est optionnel: sans lui, les mêmes informations sont obtenues en lançant git
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
 # Chemins des fichiers
 CHANGELOG_PATH = "docs/changelog.md"
 UPDATE_VERSION_SCRIPT = "script/update_version.py"
 
-def run_command(command, error_message=None):
-    """Exécute une commande shell et retourne le résultat"""
+# Préfixes des lignes d'une section du changelog
+CATEGORY_PREFIX = "- **Catégorie**: "
+ACTION_PREFIX = "- **Action**:"
+
+def report_failure(command, returncode, stderr, error_message=None):
+    """Affiche le détail d'une commande en échec et termine le script"""
+    if error_message:
+        print(f"ERREUR: {error_message}")
+        print(f"Commande: {command}")
+        print(f"Code de sortie: {returncode}")
+        print(f"Sortie d'erreur: {stderr}")
+    sys.exit(1)
+
+def run_command(argv, error_message=None, shell=False, input=None, capture_output=True,
+                encoding=None):
+    """Exécute une commande (liste d'arguments, sans shell par défaut) et retourne le résultat"""
+    # Sans capture, la sortie standard est transmise directement au terminal;
+    # seule la sortie d'erreur est conservée pour le message d'échec.
+    # encoding=None: encodage de la locale (comportement de text=True)
     try:
-        result = subprocess.run(command, shell=True, check=True, text=True,
-                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return result.stdout.strip()
+        result = subprocess.run(argv, shell=shell, check=True, text=True, input=input,
+                               encoding=encoding, errors="replace" if encoding else None,
+                               stdout=subprocess.PIPE if capture_output else None,
+                               stderr=subprocess.PIPE)
+        if not capture_output:
+            return ""
+        # rstrip seulement: la première colonne de git status --porcelain peut être un espace
+        return result.stdout.rstrip()
+    except FileNotFoundError:
+        # Avec shell=True, argv est la ligne de commande complète (une chaîne)
+        print(f"ERREUR: Commande introuvable: {argv if shell else argv[0]}")
+        sys.exit(1)
     except subprocess.CalledProcessError as e:
-        if error_message:
-            print(f"ERREUR: {error_message}")
-            print(f"Commande: {command}")
-            print(f"Code de sortie: {e.returncode}")
-            print(f"Sortie d'erreur: {e.stderr}")
+        report_failure(argv if shell else shlex.join(argv), e.returncode, e.stderr, error_message)
+
+async def run_command_async(argv, error_message=None):
+    """Version asyncio de run_command: la commande tourne pendant que la boucle traite d'autres tâches"""
+    try:
+        process = await asyncio.create_subprocess_exec(*argv, stdout=subprocess.PIPE,
+                                                       stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        print(f"ERREUR: Commande introuvable: {argv[0]}")
         sys.exit(1)
+    
+    # Même décodage que text=True: l'encodage de la locale, celui qu'utilise
+    # le processus fils pour écrire dans un tube (cp1252 sous Windows par exemple)
+    encoding = locale.getpreferredencoding(False)
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        report_failure(shlex.join(argv), process.returncode,
+                       stderr.decode(encoding, errors="replace"), error_message)
+    return stdout.decode(encoding, errors="replace").rstrip()
+
+def run_batch(commands, error_message=None, input=None, encoding=None):
+    """Exécute une suite de commandes (listes d'arguments) dans un seul shell, enchaînées par &&"""
+    # La sortie de add/commit/push n'est pas analysée: elle n'est pas capturée
+    if not commands:
+        return
+    run_command(" && ".join(shlex.join(argv) for argv in commands),
+                error_message, shell=True, input=input, capture_output=False,
+                encoding=encoding)
 
 def check_git_repo():
-    """Vérifie si le répertoire courant est un dépôt Git"""
-    return os.path.isdir(".git")
+    """Retourne la racine du dépôt Git courant, ou None hors d'un dépôt"""
+    cwd = os.getcwd()
+    root = _gitcache.load(cwd)
+    if root:
+        return root
+    
+    if pygit2 is not None:
+        git_dir = pygit2.discover_repository(cwd)
+        # workdir vaut None pour un dépôt nu
+        workdir = pygit2.Repository(git_dir).workdir if git_dir else None
+        if not workdir:
+            return None
+        root = os.path.normpath(workdir)
+    else:
+        # Un seul appel rev-parse: son code de sortie sert de test et sa sortie donne la racine
+        try:
+            result = subprocess.run(["git", "rev-parse", "--show-toplevel"], text=True,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            return None
+        if result.returncode != 0:
+            return None
+        root = result.stdout.strip()
+    
+    _gitcache.save(cwd, root)
+    return root
 
-def update_version():
+async def update_version():
     """Exécute le script update_version.py pour mettre à jour la version"""
     print("Mise à jour de la version...")
-    output = run_command(f"python3 {UPDATE_VERSION_SCRIPT}", 
-                        "Échec de la mise à jour de la version")
+    output = await run_command_async([sys.executable, UPDATE_VERSION_SCRIPT],
+                                     "Échec de la mise à jour de la version")
     print(output)
     
     # Extraire la version du résultat
@@ -57,6 +145,51 @@ def update_version():
         print("AVERTISSEMENT: Impossible d'extraire la version depuis la sortie du script")
         return "version inconnue"
 
+def find_latest_section(lines):
+    """Retourne (titre, catégorie, actions) de la première section complète du changelog, ou None"""
+    # Lecture ligne par ligne avec un petit automate, arrêtée dès la première section
+    # complète: "## date", ligne vide, "### titre", catégorie, puis les actions jusqu'au
+    # prochain "###" précédé d'une ligne vide (ou la fin du fichier)
+    state = "date"
+    title = category = None
+    action_lines = []
+    previous_blank = False
+    
+    for line in lines:
+        line = line.rstrip('\n')
+        
+        if state == "action":
+            if line.startswith("###") and previous_blank:
+                break
+            action_lines.append(line)
+            previous_blank = (line == "")
+        elif line.startswith("## ") and len(line) > 3:
+            state = "blank"
+        elif state == "blank":
+            state = "title" if line == "" else "date"
+        elif state == "title":
+            if line.startswith("### ") and len(line) > 4:
+                title = line[4:]
+                state = "category"
+            else:
+                state = "date"
+        elif state == "category":
+            if line.startswith(CATEGORY_PREFIX) and len(line) > len(CATEGORY_PREFIX):
+                category = line[len(CATEGORY_PREFIX):]
+                state = "action_header"
+            else:
+                state = "date"
+        elif state == "action_header":
+            if line.startswith(ACTION_PREFIX):
+                action_lines.append(line[len(ACTION_PREFIX):])
+                state = "action"
+            else:
+                state = "date"
+    
+    if state != "action":
+        return None
+    return title, category, '\n'.join(action_lines)
+
 def extract_latest_changes():
     """Extrait les dernières modifications du changelog"""
     if not os.path.exists(CHANGELOG_PATH):
@@ -64,22 +197,19 @@ def extract_latest_changes():
         return "Modifications non détaillées"
     
     with open(CHANGELOG_PATH, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Recherche la section la plus récente (premier ### après un ## de date)
-    sections = re.findall(r'## [^\n]+\n\n### ([^\n]+)[^\n]*\n- \*\*Catégorie\*\*: ([^\n]+)\n- \*\*Action\*\*:(.*?)(?=\n\n###|\Z)', 
-                          content, re.DOTALL)
+        section = find_latest_section(f)
     
-    if not sections:
+    if not section:
         return "Modifications non détaillées"
     
     # Première section trouvée (la plus récente)
-    title = sections[0][0].strip()
-    category = sections[0][1].strip()
+    title, category, action_text = section
+    title = title.strip()
+    category = category.strip()
     
     # Extraire les points d'action avec une indentation propre
     action_lines = []
-    for line in sections[0][2].strip().split('\n'):
+    for line in action_text.strip().split('\n'):
         line = line.strip()
         if line.startswith('-'):
             action_lines.append(f"  {line}")
@@ -90,9 +220,62 @@ def extract_latest_changes():
     
     return f"{title}\nCatégorie: {category}\n{action}"
 
+async def prepare_backup():
+    """Met à jour la version et extrait les dernières modifications en parallèle"""
+    # Le sous-processus update_version.py et la lecture du changelog (dans un thread)
+    # sont lancés ensemble puis attendus ensemble
+    return await asyncio.gather(update_version(),
+                                asyncio.to_thread(extract_latest_changes))
+
+def porcelain_status(flags):
+    """Convertit les indicateurs de statut pygit2 en code "XY" de git status --porcelain"""
+    # Fichier en conflit: porcelain l'affiche "UU" (non fusionné)
+    if flags & pygit2.GIT_STATUS_CONFLICTED:
+        return 'UU'
+    
+    index_status = ' '
+    if flags & pygit2.GIT_STATUS_INDEX_NEW:
+        index_status = 'A'
+    elif flags & pygit2.GIT_STATUS_INDEX_MODIFIED:
+        index_status = 'M'
+    elif flags & pygit2.GIT_STATUS_INDEX_DELETED:
+        index_status = 'D'
+    elif flags & pygit2.GIT_STATUS_INDEX_RENAMED:
+        index_status = 'R'
+    elif flags & pygit2.GIT_STATUS_INDEX_TYPECHANGE:
+        index_status = 'T'
+    
+    if flags & pygit2.GIT_STATUS_WT_NEW and index_status == ' ':
+        return '??'
+    
+    worktree_status = ' '
+    if flags & pygit2.GIT_STATUS_WT_MODIFIED:
+        worktree_status = 'M'
+    elif flags & pygit2.GIT_STATUS_WT_DELETED:
+        worktree_status = 'D'
+    elif flags & pygit2.GIT_STATUS_WT_RENAMED:
+        worktree_status = 'R'
+    elif flags & pygit2.GIT_STATUS_WT_TYPECHANGE:
+        worktree_status = 'T'
+    
+    return index_status + worktree_status
+
 def list_modified_files():
     """Liste tous les fichiers modifiés, ajoutés, supprimés, etc."""
-    output = run_command("git status --porcelain")
+    if pygit2 is not None:
+        # Lecture du statut par libgit2 dans le processus courant (sans lancer git);
+        # les fichiers ignorés ne sont pas inclus, comme avec git status
+        # Tout indicateur non nul autre que "ignoré" est un changement à sauvegarder,
+        # même s'il n'a pas d'équivalent porcelain (affiché alors avec son code brut)
+        files = []
+        for file_path, flags in sorted(pygit2.Repository(".").status().items()):
+            if flags & ~pygit2.GIT_STATUS_IGNORED:
+                files.append((porcelain_status(flags), file_path))
+        return files
+    
+    # --no-optional-locks: git status ne prend pas le verrou de l'index pour le rafraîchir,
+    # et ne bloque donc pas (ni n'est bloqué par) un autre processus git
+    output = run_command(["git", "--no-optional-locks", "status", "--porcelain"])
     if not output:
         return []
     
@@ -107,19 +290,30 @@ def list_modified_files():
     
     return files
 
-def stage_all_changes():
-    """Ajoute tous les fichiers modifiés au staging"""
+def stage_all_changes(modified_files, force_paths=None):
+    """Retourne les commandes qui ajoutent tous les fichiers modifiés au staging"""
     print("Ajout des fichiers modifiés...")
     
-    # Utiliser git add -A pour ajouter aussi les fichiers supprimés
-    run_command("git add -A", "Échec de l'ajout des fichiers")
-    
-    # Afficher les fichiers qui ont été ajoutés
-    modified_files = list_modified_files()
+    # Les ajouts forcés puis git add -A (qui ajoute aussi les fichiers supprimés);
+    # ils sont exécutés avec le commit et le push dans commit_and_push
+    commands = []
+    for path in force_paths or []:
+        print(f"Ajout forcé de {path}...")
+        commands.append(["git", "add", "-f", path])
+    commands.append(["git", "add", "-A"])
     
+    # Afficher les fichiers ajoutés, à partir du statut relevé avant le staging
+    # (évite un second git status)
     if modified_files:
         print("\nFichiers ajoutés au commit:")
         for status, file_path in modified_files:
+            # Avant le staging, le statut utile peut être dans la colonne Y,
+            # et les fichiers non suivis ("??") vont être ajoutés
+            if status == '??':
+                status = 'A'
+            elif status[0] == ' ':
+                status = status[1]
+            
             status_desc = ""
             if status[0] == 'M':
                 status_desc = "[Modifié]"
@@ -131,42 +325,37 @@ def stage_all_changes():
                 status_desc = "[Renommé]"
             elif status[0] == '?':
                 status_desc = "[Non suivi]"
+            elif status[0] == 'T':
+                status_desc = "[Type modifié]"
+            elif status[0] == 'U':
+                status_desc = "[Conflit]"
             else:
                 status_desc = f"[{status}]"
             
             print(f"  {status_desc} {file_path}")
+    
+    return commands
 
-def create_commit(version, changes):
-    """Crée un commit avec un message descriptif"""
+def commit_and_push(version, changes, remote, branch, today, stage_commands):
+    """Ajoute les changements, crée un commit descriptif et le pousse vers GitHub"""
     print("Création du commit...")
     
-    # Date au format ISO
-    today = datetime.now().strftime("%Y-%m-%d")
-    
     # Message de commit multi-lignes
     commit_message = f"Version {version} - {today}\n\n{changes}"
     
-    # Écrire le message dans un fichier temporaire pour gérer les caractères spéciaux
-    with open(".git_commit_msg.tmp", "w", encoding="utf-8") as f:
-        f.write(commit_message)
-    
-    # Créer le commit en utilisant le fichier temporaire
-    run_command('git commit -F .git_commit_msg.tmp', "Échec de la création du commit")
-    
-    # Supprimer le fichier temporaire
-    if os.path.exists(".git_commit_msg.tmp"):
-        os.remove(".git_commit_msg.tmp")
-
-def push_to_github(remote, branch):
-    """Pousse les changements vers GitHub"""
+    # Ajout, commit (message passé en UTF-8 sur l'entrée standard avec git commit -F -,
+    # l'encodage attendu par git quelle que soit la locale) et push
+    # en un seul appel shell. Le statut relevé avant le staging garantit déjà qu'il y a
+    # des changements: pas besoin de git diff --cached pour éviter un commit vide.
     print(f"Push vers GitHub ({remote}/{branch})...")
-    run_command(f"git push {remote} {branch}", 
-                f"Échec du push vers {remote}/{branch}")
+    run_batch(stage_commands + [["git", "commit", "-F", "-"],
+                                ["git", "push", remote, branch]],
+              f"Échec de l'ajout, du commit ou du push vers {remote}/{branch}",
+              input=commit_message, encoding="utf-8")
 
 def check_for_changes():
-    """Vérifie s'il y a des changements à committer"""
-    output = run_command("git status --porcelain")
-    return bool(output.strip())
+    """Retourne la liste des changements à committer (vide s'il n'y en a aucun)"""
+    return list_modified_files()
 
 def main():
     """Fonction principale"""
@@ -177,41 +366,52 @@ def main():
     parser.add_argument("--force-add", nargs="+", help="Force l'ajout de fichiers/dossiers spécifiques (même s'ils sont dans .gitignore)")
     args = parser.parse_args()
     
-    print(f"Script de sauvegarde GitHub: démarrage ({datetime.now().strftime('%H:%M:%S')})...")
+    # Heure de démarrage et date du commit (format ISO) calculées une seule fois
+    start = datetime.now()
+    today = start.strftime("%Y-%m-%d")
+    print(f"Script de sauvegarde GitHub: démarrage ({start.strftime('%H:%M:%S')})...")
+    
+    # Vérifier que Git est installé, sans lancer de processus (simple recherche dans le PATH)
+    if shutil.which("git") is None:
+        print("ERREUR: Git non trouvé. Installez Git et vérifiez qu'il est accessible dans le PATH.")
+        sys.exit(1)
     
     # Vérifier si le répertoire courant est un dépôt Git
-    if not check_git_repo():
+    repo_root = check_git_repo()
+    if not repo_root:
         print("ERREUR: Le répertoire courant n'est pas un dépôt Git.")
         sys.exit(1)
     
-    # Mettre à jour la version
-    version = update_version()
+    # Les chemins --force-add sont donnés par rapport au répertoire de l'utilisateur:
+    # les résoudre avant de changer de répertoire
+    force_add = [(path, os.path.abspath(path)) for path in args.force_add or []]
+    
+    # Les chemins du script sont relatifs à la racine du dépôt
+    os.chdir(repo_root)
+    
+    # Mettre à jour la version et extraire les dernières modifications en parallèle.
+    # git status doit attendre la fin de update_version, qui réécrit config.h.
+    version, changes = asyncio.run(prepare_backup())
     
     # Vérifier s'il y a des changements
-    if not check_for_changes():
+    modified_files = check_for_changes()
+    if not modified_files:
         print("Aucun changement à sauvegarder.")
         return
     
-    # Extraire les dernières modifications
-    changes = extract_latest_changes()
-    
-    # Ajouter les fichiers spécifiques si demandé
-    if args.force_add:
-        for path in args.force_add:
-            if os.path.exists(path):
-                print(f"Ajout forcé de {path}...")
-                run_command(f"git add -f {path}", f"Échec de l'ajout forcé de {path}")
-            else:
-                print(f"AVERTISSEMENT: Le chemin {path} n'existe pas et ne peut pas être ajouté.")
-    
-    # Ajouter tous les fichiers modifiés
-    stage_all_changes()
+    # Fichiers spécifiques à ajouter de force si demandé
+    force_paths = []
+    for path, abs_path in force_add:
+        if os.path.exists(abs_path):
+            force_paths.append(os.path.relpath(abs_path, repo_root))
+        else:
+            print(f"AVERTISSEMENT: Le chemin {path} n'existe pas et ne peut pas être ajouté.")
     
-    # Créer le commit
-    create_commit(version, changes)
+    # Préparer l'ajout de tous les fichiers modifiés
+    stage_commands = stage_all_changes(modified_files, force_paths)
     
-    # Pousser les changements
-    push_to_github(args.remote, args.branch)
+    # Ajouter les fichiers, créer le commit et pousser les changements
+    commit_and_push(version, changes, args.remote, args.branch, today, stage_commands)
     
     print(f"Sauvegarde terminée avec succès! ({datetime.now().strftime('%H:%M:%S')})")
     print(f"Version {version} sauvegardée sur GitHub.")
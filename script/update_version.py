@@ -15,35 +15,45 @@ Usage:
 import re
 import os
 import sys
+import shutil
 from datetime import datetime
 
 # Chemins des fichiers
 CHANGELOG_PATH = "docs/changelog.md"
 CONFIG_PATH = "include/core/config.h"
 
+# Numéro de version dans le changelog (format v2.0.0.5)
+VERSION_PATTERN = re.compile(r'v(\d+)\.(\d+)\.(\d+)\.(\d+)')
+
+# Définitions de config.h mises à jour, compilées une seule fois en un motif unique
+# pour n'effectuer qu'un seul parcours du fichier
+CONFIG_DEFINES_PATTERN = re.compile(
+    r'#define (?:VERSION_(?P<field>MAJOR|MINOR|PATCH|BUILD) \d+'
+    r'|VERSION_STRING "v[\d\.]+"'
+    r'|BUILD_DATE "[\d/]+")'
+)
+
 def extract_version_from_changelog():
     """Extrait la dernière version mentionnée dans le changelog."""
     if not os.path.exists(CHANGELOG_PATH):
         print(f"Erreur: Fichier {CHANGELOG_PATH} introuvable.")
         return None
 
+    # Lit le fichier ligne par ligne et s'arrête à la première version trouvée
+    # (supposée être la plus récente), sans charger tout le changelog
     with open(CHANGELOG_PATH, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Recherche la dernière version mentionnée (format v2.0.0.5)
-    version_matches = re.findall(r'v(\d+)\.(\d+)\.(\d+)\.(\d+)', content)
-    
-    if not version_matches:
-        print("Aucune version trouvée dans le changelog.")
-        return None
+        for line in f:
+            match = VERSION_PATTERN.search(line)
+            if match:
+                return {
+                    'major': int(match.group(1)),
+                    'minor': int(match.group(2)),
+                    'patch': int(match.group(3)),
+                    'build': int(match.group(4))
+                }
     
-    # Retourne la première occurrence (supposée être la plus récente)
-    return {
-        'major': int(version_matches[0][0]),
-        'minor': int(version_matches[0][1]),
-        'patch': int(version_matches[0][2]),
-        'build': int(version_matches[0][3])
-    }
+    print("Aucune version trouvée dans le changelog.")
+    return None
 
 def update_config_version(version):
     """Met à jour les définitions de version dans config.h"""
@@ -52,49 +62,39 @@ def update_config_version(version):
         return False
     
     with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-        content = f.read()
+        original_content = f.read()
     
-    # Met à jour les définitions de version
-    content = re.sub(
-        r'#define VERSION_MAJOR \d+', 
-        f'#define VERSION_MAJOR {version["major"]}', 
-        content
-    )
-    content = re.sub(
-        r'#define VERSION_MINOR \d+', 
-        f'#define VERSION_MINOR {version["minor"]}', 
-        content
-    )
-    content = re.sub(
-        r'#define VERSION_PATCH \d+', 
-        f'#define VERSION_PATCH {version["patch"]}', 
-        content
-    )
-    content = re.sub(
-        r'#define VERSION_BUILD \d+', 
-        f'#define VERSION_BUILD {version["build"]}', 
-        content
-    )
-    
-    # Met à jour la chaîne de version complète
     version_string = f'v{version["major"]}.{version["minor"]}.{version["patch"]}.{version["build"]}'
-    content = re.sub(
-        r'#define VERSION_STRING "v[\d\.]+"', 
-        f'#define VERSION_STRING "{version_string}"', 
-        content
-    )
-    
-    # Met à jour la date de build
     today = datetime.now().strftime("%d/%m/%Y")
-    content = re.sub(
-        r'#define BUILD_DATE "[\d/]+"',
-        f'#define BUILD_DATE "{today}"',
-        content
-    )
     
-    # Écrit le contenu mis à jour
-    with open(CONFIG_PATH, 'w', encoding='utf-8') as f:
-        f.write(content)
+    def replace_define(match):
+        """Construit la nouvelle définition correspondant à la ligne trouvée"""
+        field = match.group("field")
+        if field:
+            return f'#define VERSION_{field} {version[field.lower()]}'
+        if match.group(0).startswith("#define VERSION_STRING"):
+            return f'#define VERSION_STRING "{version_string}"'
+        return f'#define BUILD_DATE "{today}"'
+    
+    # Met à jour les définitions de version, la chaîne de version complète
+    # et la date de build en un seul passage
+    content = CONFIG_DEFINES_PATTERN.sub(replace_define, original_content)
+    
+    # N'écrit config.h que s'il a changé: le réécrire à l'identique modifierait sa date
+    # et forcerait PlatformIO à recompiler tout ce qui l'inclut
+    if content != original_content:
+        # Écriture dans un fichier voisin puis remplacement atomique, en conservant
+        # les permissions de config.h; le fichier voisin est supprimé en cas d'échec
+        tmp_path = CONFIG_PATH + ".new"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            shutil.copymode(CONFIG_PATH, tmp_path)
+            os.replace(tmp_path, CONFIG_PATH)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
     
     print(f"Version mise à jour à {version_string} dans {CONFIG_PATH}")
     print(f"Date de build mise à jour à {today}")